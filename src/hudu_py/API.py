@@ -5,21 +5,153 @@
 
 
 import datetime
+import hashlib
+from collections import defaultdict, OrderedDict
+from email.utils import parsedate_to_datetime
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
 from enum import Enum
 import os
+import tempfile
 import time
+import random
+from types import MappingProxyType
 import logging
+from operator import attrgetter
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from logger import NullHandler, HideSensitiveFilter, HideSensitiveService
+from limiter import TokenBucket
+
+def _json_default(obj):
+    # orjson writes dates and times as ISO 8601 by itself, so the stdlib path does the same
+    if isinstance(obj, (datetime.date, datetime.time)):
+        return obj.isoformat()
+    raise TypeError(f'Type is not JSON serializable: {type(obj).__name__}')
+
+
+def _stdlib_dumps(obj):
+    # match orjson's output: compact, UTF-8 bytes
+    return json.dumps(obj, default=_json_default, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+# orjson is a lot quicker at (de)serialising big pages, but it's optional.
+# Both ways take the same input (non-str keys, dates) and give the same bytes
+try:
+    import orjson
+
+    def _orjson_dumps(obj):
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+
+    _loads = orjson.loads
+    _dumps = _orjson_dumps
+except ImportError:
+    orjson = None
+    _loads = json.loads
+    _dumps = _stdlib_dumps
+
+# Gateway errors are retried below us, the same way on both transports
+GATEWAY_STATUSES = (502, 503, 504)
+GATEWAY_RETRIES = 5
+GATEWAY_BACKOFF = 0.5
+# urllib3 only retries these on a bad status, a POST could have gone through already
+IDEMPOTENT_METHODS = frozenset(['DELETE', 'GET', 'HEAD', 'OPTIONS', 'PUT', 'TRACE'])
+
+# httpx (with h2) is optional too, and lets us talk HTTP/2 to Hudu
+try:
+    import httpx
+    import h2
+    HTTPX_AVAILABLE = True
+
+    class _RetryTransport(httpx.HTTPTransport):
+        # httpx only retries failed connections, this adds the gateway error retries urllib3 does for requests
+        def handle_request(self, request):
+            for attempt in range(GATEWAY_RETRIES + 1):
+                response = super().handle_request(request)
+                if response.status_code not in GATEWAY_STATUSES or request.method not in IDEMPOTENT_METHODS or attempt == GATEWAY_RETRIES:
+                    return response
+                # same backoff as urllib3: nothing the first time, then backoff * 2^n, unless a 503 says otherwise
+                delay = 0 if attempt == 0 else GATEWAY_BACKOFF * 2 ** attempt
+                if response.status_code == 503:
+                    try:
+                        delay = float(response.headers.get('Retry-After', delay))
+                    except ValueError:
+                        pass
+                response.read()
+                response.close()
+                time.sleep(delay)
+except ImportError:
+    HTTPX_AVAILABLE = False
 
 null_handler = NullHandler()
 logger = logging.getLogger(__name__)
 logger.addHandler(null_handler)
 logger.addFilter(HideSensitiveFilter())
 
+# Lookup tables are cached per domain, api version and api key, both in this process and on disk
+LOOKUP_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'hudu_py')
+_lookup_cache = {}
+
+# How many assets' (name, asset_layout_id) update_asset remembers
+ASSET_META_CACHE_SIZE = 4096
+
+# HTTP method -> name of the session method for it. Looked up on self.session at call time,
+# so swapping the session swaps every verb. GETs go through iter_pages instead
+_VERB_MAP = {
+    'GET':    'get',
+    'POST':   'post',
+    'PUT':    'put',
+    'DELETE': 'delete'
+}
+
+# Custom field labels are sent to Hudu lower case, with underscores for spaces
+_CF_TRANS = str.maketrans({' ': '_'})
+
+
+def _compact(d):
+    # Drop any params that weren't given
+    return {k: v for k, v in d.items() if v is not None}
+
+
+# How many times a page is retried after a 429 before giving up
+MAX_ATTEMPTS = 8
+# X-RateLimit-Reset values below this are seconds from now rather than an epoch timestamp
+RESET_DELTA_MAX = 10 ** 6
+
+
+def _sleep_for_429(response, attempt):
+    # Wait as long as Hudu tells us to, otherwise back off exponentially (with a bit of jitter), capped at a minute
+    delay = None
+    retry_after = response.headers.get('Retry-After')
+    if retry_after is not None:
+        try:
+            delay = float(retry_after)
+        except ValueError:
+            # Retry-After can also be an HTTP date
+            try:
+                delay = (parsedate_to_datetime(retry_after) - datetime.datetime.now(datetime.timezone.utc)).total_seconds()
+            except (TypeError, ValueError):
+                pass
+    reset = response.headers.get('X-RateLimit-Reset')
+    if delay is None and reset is not None:
+        try:
+            reset = float(reset)
+            # Some servers send seconds until the reset, others an epoch timestamp
+            delay = reset if reset < RESET_DELTA_MAX else reset - time.time()
+        except ValueError:
+            pass
+    if delay is None or delay <= 0:
+        # nothing useful (or a reset that's already passed), don't just spin through the attempts
+        delay = min(2 ** attempt + random.random(), 60)
+    logger.debug(f'429 received, sleeping for {delay}s (attempt {attempt + 1} of {MAX_ATTEMPTS})')
+    time.sleep(delay)
+    return delay
+
 
 class Hudu(object):
+    # No per-instance __dict__, handy when there's a client per tenant
+    __slots__ = ('headers', 'domain', 'url', 'api_version', '__pageSize', 'session', 'companies', 'asset_layouts', '_base', '_limiter', '_body_kwarg', 'max_workers', 'rps', 'lookup_ttl', 'asset_meta_ttl', '_asset_meta_cache')
 
     class FieldType(Enum):
         TEXT = 'Text'
@@ -38,6 +170,9 @@ class Hudu(object):
         ASSETTAG = 'AssetTag'
 
     class Field():
+        __slots__ = ('label', 'min', 'max', 'show_in_list', 'required', 'field_type', 'hint', 'options', 'posistion', 'expiration', 'linkable_id')
+        _values = attrgetter(*__slots__)
+
         def __init__(self, label: str, show_in_list: bool, required: bool, field_type: Enum, min: int = None, max: int = None, hint: str = None, options: str = None, position: int = None, expiration: bool = False, linkable_id: int = None):
             self.label = label
             self.min = min
@@ -51,7 +186,11 @@ class Hudu(object):
             self.expiration = expiration
             self.linkable_id = linkable_id
 
-    def __init__(self, api_key=None, domain=None, api_version=None, lookupTables = False):
+        def to_dict(self):
+            # Fields have no __dict__, this is what gets sent to Hudu
+            return dict(zip(self.__slots__, self._values(self)))
+
+    def __init__(self, api_key=None, domain=None, api_version=None, lookupTables = False, max_workers: int = 8, rps: float = 4, lookup_ttl: int = 3600, http2: bool = False, asset_meta_ttl: int = 0):
         # API key can only be defined on object creation. If no key found, then do not proceed
         if api_key is None: api_key = os.environ.get('HUDU_API_KEY', None)
         if api_key is None:
@@ -69,123 +208,252 @@ class Hudu(object):
         
         self.__pageSize = 25
 
-        self.headers = {
+        # Headers don't change after this, the session keeps its own copy. Read only, but still a mapping
+        self.headers = MappingProxyType({
             "accept":       'application/json',
             "Content-Type": 'application/json',
             "x-api-key":    api_key
-        }
+        })
         
         self.domain = domain
         self.api_version = api_version
         url = f'https://{domain}/api/{api_version}'
         self.url = url
-        # Add lookup tables
+        # endpoints just get tacked on the end of this
+        self._base = url + '/'
+        # Paginated GETs fetch up to max_workers pages at once, over one keep-alive session
+        self.max_workers = max_workers
+        # Page requests are paced by a token bucket, which the worker pool shares
+        # Hudu allows 300 requests a minute, 4 a second (plus a burst of 4) stays under that
+        if rps is None or rps <= 0:
+            raise ValueError('rps must be greater than 0')
+        self.rps = rps
+        self._limiter = TokenBucket(rate=self.rps, capacity=max(self.rps, 1))
+        if http2:
+            # One HTTP/2 connection multiplexes all the page requests. 429s are still handled by _fetch_page
+            # Set up to behave like the requests session: no timeout, follow redirects, retry gateway errors
+            if not HTTPX_AVAILABLE:
+                raise ImportError("http2 needs httpx with HTTP/2 support, please install 'httpx[http2]'")
+            transport = _RetryTransport(http2=True, retries=GATEWAY_RETRIES, limits=httpx.Limits(max_connections=32))
+            self.session = httpx.Client(headers=self.headers, timeout=None, follow_redirects=True, transport=transport)
+            self._body_kwarg = 'content'
+        else:
+            self.session = requests.Session()
+            self.session.headers.update(self.headers)
+            # Pool connections so calls reuse them, and let urllib3 retry gateway errors
+            # 429s are left to _fetch_page, so they're retried in one place and go through the rate limiter
+            retries = Retry(total=GATEWAY_RETRIES, backoff_factor=GATEWAY_BACKOFF, status_forcelist=GATEWAY_STATUSES, respect_retry_after_header=True, raise_on_status=False)
+            self.session.mount('https://', HTTPAdapter(pool_connections=16, pool_maxsize=32, max_retries=retries))
+            self._body_kwarg = 'data'
+        # Add lookup tables. Cached copies younger than lookup_ttl seconds are used instead of hitting the API
+        self.lookup_ttl = lookup_ttl
+        # (id, company_id) -> (time, name, asset_layout_id), so update_asset doesn't need to look them up every time.
+        # Off by default: a cached name is written back on the next update, so a rename made elsewhere
+        # within asset_meta_ttl seconds would be undone. Only turn it on if this client is the only one renaming assets
+        self.asset_meta_ttl = asset_meta_ttl
+        self._asset_meta_cache = OrderedDict()
         logger.debug('Create lookup tables:')
 
         if lookupTables is True:
             for item in ['companies', 'asset_layouts']:
                 logger.debug(item)
-                temp_raw = self.do_request('GET',item)
-                lookup_table = {}
-                for c in temp_raw:
-                    lookup_table[c['name']] = c['id']
-                    lookup_table[c['id']] = c['name']
+                temp_raw = self._load_lookup_rows(item)
+                # map both ways, name -> id and id -> name
+                lookup_table = {k: v for c in temp_raw for k, v in ((c['name'], c['id']), (c['id'], c['name']))}
                 setattr(self,item,lookup_table)
             temp_raw = None
                 
+    def _load_lookup_rows(self, table):
+        # Check memory first, then disk, and only then go to Hudu
+        # Keys can be scoped differently, so each key gets its own tables. Only a hash of it is kept
+        key_hash = hashlib.sha256(self.headers['x-api-key'].encode('utf-8')).hexdigest()[:16]
+        key = (self.domain, self.api_version, key_hash, table)
+        now = time.time()
+        cached = _lookup_cache.get(key)
+        if cached is not None and now - cached[0] < self.lookup_ttl:
+            return cached[1]
+
+        cache_dir = os.path.join(LOOKUP_CACHE_DIR, str(self.domain), str(self.api_version), key_hash)
+        cache_file = os.path.join(cache_dir, f'{table}.json')
+        try:
+            mtime = os.path.getmtime(cache_file)
+            if now - mtime < self.lookup_ttl:
+                with open(cache_file, "r") as file:
+                    rows = [{'id': c['id'], 'name': c['name']} for c in json.load(file)]
+                _lookup_cache[key] = (mtime, rows)
+                return rows
+        except (OSError, ValueError, TypeError, KeyError):
+            # missing, unreadable or not what we wrote, just fetch it again
+            pass
+
+        # Only keep what the lookup tables need
+        rows = [{'id': c['id'], 'name': c['name']} for c in self.do_request('GET',table)]
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            # Write to a temp file and swap it in, so other processes never read half a file
+            with tempfile.NamedTemporaryFile('w', dir=cache_dir, suffix='.tmp', delete=False) as file:
+                json.dump(rows, file)
+            os.replace(file.name, cache_file)
+        except OSError as e:
+            logger.debug(f'Could not write lookup cache {cache_file}: {e}')
+        _lookup_cache[key] = (now, rows)
+        return rows
+
     def do_raw_get(self, endpoint=None, params={}):
         # For troubleshooting and data format examination more than anything
-        URI = f'{self.url}/{endpoint}'
-        response = requests.get(URI, headers=self.headers, params=params)
+        URI = self._base + endpoint
+        response = self.session.get(URI, params=params)
         return response
 
+    def _fetch_page(self, URI, params, page, attempt=0):
+        # Fetch a single page of a GET. Returns (data, is_last), or (None, False) if we were rate limited
+        params = dict(params, page=page)
+        logger.debug(f"page: {page}  ---  page_size: {params['page_size']}")
+        self._limiter.acquire()
+        response = self.session.get(URI, params=params)
+        # There's a bug in here somewhere, pulling individual assets doesn't always work
+        match response.status_code:
+            case 200:
+                # Response OK 
+                r_json = _loads(response.content)
+                if isinstance(r_json, dict):
+                    # when the response is wrapped in a named object, it will be the only/first object in the response
+                        # when getting single assets, the returned type is 'response' ...?
+                    key_name = next(iter(r_json))
+                    r_data = r_json[key_name]
+                elif isinstance(r_json, list):
+                    # when the response is just a list, we can pass it through
+                    r_data = r_json
+                else:
+                    # Just in case there are any other types of responses I haven't accounted for...
+                    raise ValueError(f"I'm not set up to handle this type: {type(r_json)}")
+                if isinstance(r_data, dict):
+                    # at this point, if our result is a dict, then it is just one item being returned
+                    return [ r_data ], True
+                # if its not a dict, it'll be a list of items
+                return r_data, len(r_data) < params['page_size']
+            case 429:
+                # too many requests, sleep for a bit
+                if attempt + 1 >= MAX_ATTEMPTS:
+                    raise ValueError(f'Error 429 --- still rate limited after {MAX_ATTEMPTS} attempts')
+                _sleep_for_429(response, attempt)
+                return None, False
+            case _:
+                err_str = f'Error {response.status_code}'
+                # requests calls it reason, httpx calls it reason_phrase
+                reason = getattr(response, 'reason', None) or getattr(response, 'reason_phrase', None)
+                if reason:
+                    err_str += f' --- {reason}'
+                raise ValueError(err_str)
+
+    def iter_pages(self, endpoint=None, p={}):
+        # Generator over the items of a paginated GET, so callers can stream them or stop early without fetching every page
+        if endpoint is None:
+            raise ValueError('Please specify endpoint.')
+        URI = self._base + endpoint
+        logger.debug(f'GET: {URI}')
+        logger.debug(f'p: {p}')
+
+        # Deal with Hudu APIs pagination
+        # Try 1000 page_size first. Some GET endpoints don't support page_size
+        params = dict(p)
+        params['page_size'] = 1000
+
+        # The first page is fetched on its own, so we know the shape of the response before fanning out
+        r_data, is_last = None, False
+        attempt = 0
+        while r_data is None:
+            r_data, is_last = self._fetch_page(URI, params, 1, attempt)
+            attempt += 1
+        # If the endpoint doesn't support page_size, and it returns exactly 25 results, set the page_size to 25
+        if len(r_data) == 25:
+            params['page_size'] = 25
+            is_last = False
+        yield from r_data
+
+        # Then fetch the rest concurrently. The number of pages in flight starts at 1 and doubles with every full page,
+        # up to max_workers, so short results don't pay for pages past the end
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        window = 1
+        next_page = 2       # next page to ask for
+        next_yield = 2      # next page to hand back to the caller
+        last_page = 1 if is_last else None
+        pending = {}        # future -> (page, attempt)
+        done = {}           # page -> items, or the exception fetching it raised
+        try:
+            while True:
+                # hand back whatever we have, in order
+                while next_yield in done:
+                    r_data = done.pop(next_yield)
+                    if isinstance(r_data, Exception):
+                        raise r_data
+                    yield from r_data
+                    next_yield += 1
+                if last_page is not None and next_yield > last_page:
+                    break
+
+                while last_page is None and len(pending) < window:
+                    pending[executor.submit(self._fetch_page, URI, params, next_page)] = (next_page, 0)
+                    next_page += 1
+
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    if future not in pending:
+                        # already dropped, it was past the end
+                        continue
+                    n, attempt = pending.pop(future)
+                    if last_page is not None and n > last_page:
+                        # past the end, whatever it returned doesn't matter
+                        continue
+                    try:
+                        r_data, last = future.result()
+                    except Exception as e:
+                        # only raise it if it turns out we need this page
+                        done[n] = e
+                        continue
+                    if r_data is None:
+                        # rate limited, queue the same page up again
+                        pending[executor.submit(self._fetch_page, URI, params, n, attempt + 1)] = (n, attempt + 1)
+                        continue
+                    done[n] = r_data
+                    if last:
+                        last_page = n if last_page is None else min(last_page, n)
+                        # drop anything we asked for past the end
+                        for other, (m, _) in list(pending.items()):
+                            if m > last_page:
+                                other.cancel()
+                                del pending[other]
+                    else:
+                        window = min(window * 2, self.max_workers)
+        finally:
+            # if the caller stopped early, don't bother fetching anything still queued
+            executor.shutdown(wait=False, cancel_futures=True)
+
     def do_request(self, method: str = 'GET', endpoint=None, p={}):
         # p can be used for params or data, depending on the call
-        result = None
-        methods = ['GET','POST','PUT','DELETE']
-        if method not in methods:
-            raise ValueError(f'Please specify HTTP method: {", ".join(methods)}')
+        if method not in _VERB_MAP:
+            raise ValueError(f'Please specify HTTP method: {", ".join(_VERB_MAP)}')
         if endpoint is None:
             raise ValueError('Please specify endpoint.')
-        
-        URI = f'{self.url}/{endpoint}'
+        if method == 'GET':
+            return list(self.iter_pages(endpoint, p))
+        fn = getattr(self.session, _VERB_MAP[method])
+
+        URI = self._base + endpoint
         logger.debug(f'{method}: {URI}')
         logger.debug(f'p: {p}')
-        match method:
-            case 'GET':
-                # Deal with Hudu APIs pagination
-                # Try 1000 page_size first. Some GET endpoints don't support page_size
-                result = []
-                p['page'] = 1
-                p['page_size'] = 1000
-                response_size = p['page_size']
-
-                # for put and post: -H 'Content-Type: application/json' 
-                while response_size >= p['page_size']:
-                    # try:
-                    #     logger.debug(json.dumps(p))
-                    # except:
-                    #     logger.debug(p)
-                    logger.debug(f"response_size: {response_size}  ---  page_size: {p['page_size']}")
-                    response = requests.get(URI, headers=self.headers, params=p)
-                    time.sleep(0.01)
-                    # There's a bug in here somewhere, pulling individual assets doesn't always work
-                    match response.status_code:
-                        case 200:
-                            # Response OK 
-                            r_json = response.json()
-                            match type(r_json).__name__: 
-                                case 'dict':
-                                    # when the response is wrapped in a named object, it will be the only/first object in the response
-                                        # when getting single assets, the returned type is 'response' ...?
-                                    key_name = list(r_json.keys())[0]
-                                    r_data = r_json[key_name]
-                                case 'list':
-                                    # when the response is just a list, we can pass it through
-                                    r_data = r_json
-                                case _:
-                                    # Just in case there are any other types of responses I haven't accounted for...
-                                    raise ValueError(f"I'm not set up to handle this type: {type(r_json)}")
-                            if type(r_data) is dict:
-                                # at this point, if our result is a dict, then it is just one item being returned
-                                response_size = 1
-                                result = [ r_data ]
-                            else:
-                                # if its not a dict, it'll be a list of items
-                                response_size = len(r_data)
-                                result += r_data
-                            #if len(r_data) > 0:
-                            # If the endpoint doesn't support page_size, and it returns exactly 25 results, set the page_size to 25
-                            if response_size == 25:
-                                p['page_size'] = 25
-                            p['page'] += 1
-                        case 429:
-                            # too many requests, sleep for a bit
-                            time.sleep(30)
-                        case _:
-                            err_str = f'Error {response.status_code}'
-                            if hasattr(response, 'reason'):
-                                err_str += f' --- {response.reason}'
-                            raise ValueError(err_str)
-            case ('PUT' | 'POST' | 'DELETE'):
-                match method:
-                    case ('PUT' | 'POST'):
-                        body = json.dumps(p)
-                        logger.debug(f'Body: {body}')
-                        match method:
-                            case 'PUT':
-                                response = requests.put(URI, headers=self.headers, data=body)
-                            case 'POST':
-                                response = requests.post(URI, headers=self.headers, data=body)
-                    case 'DELETE':
-                        response = requests.delete(URI, headers=self.headers)
-
-                logger.debug(f'response: {response}')
-                
-                try:
-                    result = response.json()
-                except:
-                    result = response
+        if method in ('PUT', 'POST'):
+            # send it pre-encoded, the session already has the JSON content type
+            response = fn(URI, **{self._body_kwarg: _dumps(p)})
+        else:
+            response = fn(URI)
+
+        logger.debug(f'response: {response}')
+        
+        try:
+            result = _loads(response.content)
+        except:
+            result = response
         return result
 
     ###
@@ -193,8 +461,6 @@ class Hudu(object):
     ###
 
     def get_activity_logs(self, user_id: int = None, user_email: str = None, resource_id: int = None, resource_type: str = None, action_message: str = None, start_date: datetime = None):
-        params = {}
-
         if resource_id is not None and resource_type is None:
             # REE
             resource_id = None
@@ -204,14 +470,16 @@ class Hudu(object):
             resource_type = None
             message = "resource type (Asset, AssetPassword, Company, Article, etc.). Must be coupled with resource_id"
         
-        if user_id is not None: params['user_id'] = user_id
-        if user_email is not None: params['user_email'] = user_email
-        if resource_id is not None: params['resource_id'] = resource_id
-        if resource_type is not None: params['resource_type'] = resource_type
-        if action_message is not None: params['action_message'] = action_message
-        if start_date is not None: params['start_date'] = start_date.isoformat() #Must be in ISO 8601 format
+        if start_date is not None: start_date = start_date.isoformat() #Must be in ISO 8601 format
 
-        return self.do_request('GET','activity_logs', params)
+        return self.do_request('GET','activity_logs', _compact({
+            'user_id': user_id,
+            'user_email': user_email,
+            'resource_id': resource_id,
+            'resource_type': resource_type,
+            'action_message': action_message,
+            'start_date': start_date
+        }))
 
     ###
     # Api info
@@ -224,40 +492,38 @@ class Hudu(object):
     # ARTICLES
     ###
     def get_articles(self, name: str = None, company_id: int = None, draft: bool = None):
-        params = {}
-
-        if name is not None: params['name'] = name
-        if company_id is not None: params['company_id'] = company_id
-        if draft is not None: params['draft'] = draft
+        return self.do_request('GET','articles',_compact({'name': name, 'company_id': company_id, 'draft': draft}))
 
-        return self.do_request('GET','articles',params)
-
-    def get_article(self, id):
-        return self.do_request('GET',f'articles/{id}',params)
+    def get_article(self, id, params=None):
+        return self.do_request('GET',f'articles/{id}',params or {})
 
     def create_article(self, name: str, content: str, enable_sharing: bool = None, folder_id: int = None, company_id: int = None):
         data = {
-            'article': {}
+            'article': {
+                'name': name,
+                'content': content
+            }
         }
+        data['article'].update(_compact({
+            'enable_sharing': enable_sharing,
+            'folder_id': folder_id,
+            'company_id': company_id
+        }))
 
-        data['article']['name'] = name
-        data['article']['content'] = content
-        if enable_sharing is not None: data['article']['enable_sharing'] = enable_sharing
-        if folder_id is not None: data['article']['folder_id'] = folder_id
-        if company_id is not None: data['article']['company_id'] = company_id
-        
         return self.do_request('POST',f'articles',data)
             
     def update_article(self, id: int, name: str, content: str, enable_sharing: bool = None, folder_id: int = None, company_id: int = None):
         data = {
-            'article': {}
+            'article': {
+                'name': name,
+                'content': content
+            }
         }
-
-        data['article']['name'] = name
-        data['article']['content'] = content
-        if enable_sharing is not None: data['article']['enable_sharing'] = enable_sharing
-        if folder_id is not None: data['article']['folder_id'] = folder_id
-        if company_id is not None: data['article']['company_id'] = company_id
+        data['article'].update(_compact({
+            'enable_sharing': enable_sharing,
+            'folder_id': folder_id,
+            'company_id': company_id
+        }))
         return self.do_request('PUT',f'articles/{id}',data)
         
     def remove_article(self, id):
@@ -274,54 +540,52 @@ class Hudu(object):
     ###
 
     def get_asset_layouts(self, name: str = None):
-        params = {}
-        if name is not None: params['name'] = name
-        return self.do_request('GET','asset_layouts',params)
+        return self.do_request('GET','asset_layouts',_compact({'name': name}))
         
-    def get_asset_layout(self, id: int):
-        return self.do_request('GET',f'asset_layouts/{id}',params)
+    def get_asset_layout(self, id: int, params=None):
+        return self.do_request('GET',f'asset_layouts/{id}',params or {})
         
     ## Fields to be list of dict
     def create_asset_layouts(self, name: str, icon: str, color: str, icon_color: str,  fields: list[dict], include_passwords: bool = None, include_photos: bool = None, include_comments: bool = None, include_files: bool = None, password_types: str = None):
         data = {
-            'asset_layout': {}
+            'asset_layout': {
+                'name': name,
+                'icon': icon,
+                'color': color,
+                'icon_color': icon_color
+            }
         }
-
-        data['asset_layout']['name'] = name
-        data['asset_layout']['icon'] = icon
-        data['asset_layout']['color'] = color
-        data['asset_layout']['icon_color'] = icon_color
-        if include_passwords is not None: data['asset_layout']['include_passwords'] = include_passwords
-        if include_photos is not None: data['asset_layout']['include_photos'] = include_photos
-        if include_comments is not None: data['asset_layout']['include_comments'] = include_comments
-        if include_files is not None: data['asset_layout']['include_files'] = include_files
-        if password_types is not None: data['asset_layout']['password_types'] = password_types
-
-        data['asset_layout']['fields'] = []
-        for field in fields:
-            data['asset_layout']['fields'].append(field.__dict__)
+        data['asset_layout'].update(_compact({
+            'include_passwords': include_passwords,
+            'include_photos': include_photos,
+            'include_comments': include_comments,
+            'include_files': include_files,
+            'password_types': password_types
+        }))
+
+        data['asset_layout']['fields'] = [field.to_dict() for field in fields]
         
         return self.do_request('POST','asset_layouts',data)
         
             
     def update_asset_layouts(self, id: int, name: str, icon: str, color: str, icon_color: str,  fields: list[dict], include_passwords: bool = None, include_photos: bool = None, include_comments: bool = None, include_files: bool = None, password_types: str = None):
         data = {
-            'asset_layout': {}
+            'asset_layout': {
+                'name': name,
+                'icon': icon,
+                'color': color,
+                'icon_color': icon_color
+            }
         }
-
-        data['asset_layout']['name'] = name
-        data['asset_layout']['icon'] = icon
-        data['asset_layout']['color'] = color
-        data['asset_layout']['icon_color'] = icon_color
-        if include_passwords is not None: data['asset_layout']['include_passwords'] = include_passwords
-        if include_photos is not None: data['asset_layout']['include_photos'] = include_photos
-        if include_comments is not None: data['asset_layout']['include_comments'] = include_comments
-        if include_files is not None: data['asset_layout']['include_files'] = include_files
-        if password_types is not None: data['asset_layout']['password_types'] = password_types
-
-        data['asset_layout']['fields'] = []
-        for field in fields:
-            data['asset_layout']['fields'].append(field.__dict__)
+        data['asset_layout'].update(_compact({
+            'include_passwords': include_passwords,
+            'include_photos': include_photos,
+            'include_comments': include_comments,
+            'include_files': include_files,
+            'password_types': password_types
+        }))
+
+        data['asset_layout']['fields'] = [field.to_dict() for field in fields]
         
         return self.do_request('PUT',f'asset_layouts/{id}',data)
 
@@ -329,20 +593,15 @@ class Hudu(object):
     # Asset passwords
     ###
     def get_asset_passwords(self, name: str = None, company_id: int = None, slug: str = None, search: str = None):
-        params = {}
-        if name is not None: params['name'] = name
-        if company_id is not None: params['company_id'] = company_id
-        if slug is not None: params['slug'] = slug
-        if search is not None: params['search'] = search
-
-        return self.do_request('GET','asset_passwords',params)
+        return self.do_request('GET','asset_passwords',_compact({'name': name, 'company_id': company_id, 'slug': slug, 'search': search}))
     
     def get_asset_password(self, id: int):
         # when getting individual passwords or assets, we should look up their relations and include them as well
 
         return self.do_request('GET',f'asset_passwords/{id}')
     
-    def create_asset_password(self, name: str, username: str, password: str, passwordable_type: str, otp_secret: str, url: str, password_type: str, slug: str, company_id: int, description: str = None, passwordable_id: int = 0, in_portal: bool = True, password_folder_id: int = 0):
+    def create_asset_password(self, name: str, username: str, password: str, passwordable_type: str, otp_secret: str, url: str, password_type: str, slug: str, company_id: int, description: str = None, passwordable_id: int = None, in_portal: bool = None, password_folder_id: int = None):
+        _loc = locals()
         optional_args = ['description','passwordable_type','passwordable_id','in_portal','otp_secret','url','password_type','password_folder_id','slug']
         # define required params
         data = {
@@ -353,10 +612,8 @@ class Hudu(object):
                 'company_id': company_id
             }
         }
-        # loop through optional params, add any that have been defined
-        for arg in optional_args:
-            if hasattr(locals(),arg):
-                data[arg] = getattr(locals(),arg)
+        # add any optional params that have been defined
+        data['asset_password'].update({k: _loc[k] for k in optional_args if _loc.get(k) is not None})
 
         return self.do_request('POST','asset_passwords',data)
 
@@ -365,27 +622,20 @@ class Hudu(object):
     ###
 
     def get_assets(self, company_id: int = None, id: int = None, name: str = None, primary_serial: int = None, asset_layout_id: int = None, archived: bool = False):
-        params = {}
-
         if company_id is not None and id is None and name is None and primary_serial is None and asset_layout_id is None:
-            return self.get_company_assets(company_id=company_id, page=page, archived=archived, page_size=page_size)
-
-        if company_id is not None: params['company_id'] = company_id
-        if id is not None: params['id'] = id
-        if name is not None: params['name'] = name
-        if primary_serial is not None: params['primary_serial'] = primary_serial
-        if asset_layout_id is not None: params['asset_layout_id'] = asset_layout_id
-        if archived is not None: params['archived'] = archived
-        
-        return self.do_request('GET','assets',params)
+            return self.get_company_assets(company_id=company_id, archived=archived)
 
-    def get_company_assets(self, company_id: int = None, archived: bool = False):
-        params = {}
-
-        if company_id is not None: params['company_id'] = company_id
-        if archived is not None: params['archived'] = archived
+        return self.do_request('GET','assets',_compact({
+            'company_id': company_id,
+            'id': id,
+            'name': name,
+            'primary_serial': primary_serial,
+            'asset_layout_id': asset_layout_id,
+            'archived': archived
+        }))
 
-        return self.do_request('GET',f'companies/{company_id}/assets',params)
+    def get_company_assets(self, company_id: int = None, archived: bool = False):
+        return self.do_request('GET',f'companies/{company_id}/assets',_compact({'company_id': company_id, 'archived': archived}))
         
     def get_company_asset(self, company_id: int, id: int):
         # When looking up single assets, lets include its relations
@@ -408,11 +658,10 @@ class Hudu(object):
         
         # Get its passwords
         # passwordable_id is the id of the password parent asset
-        all_passwords = self.do_request('GET','asset_passwords',{'company_id':company_id})
-        passwords = []
-        for p in all_passwords:
-            if p['passwordable_id'] == id:
-                passwords.append(p)
+        # Ask Hudu to filter on it, but still check it here in case the filter is ignored and we get all of the company's passwords
+        all_passwords = self.do_request('GET','asset_passwords',{'company_id':company_id, 'passwordable_id': id})
+        # and passwordable_type, otherwise a website password with the same id would match too
+        passwords = [p for p in all_passwords if p['passwordable_id'] == id and p.get('passwordable_type') == 'Asset']
 
         # result = dict(**data, **passwords)
         result = {
@@ -421,50 +670,84 @@ class Hudu(object):
         }    
         return result
 
+    def get_company_assets_with_passwords(self, company_id: int, archived: bool = False):
+        # Same shape as get_company_asset, for every asset in the company, using one pass over the company's passwords
+        assets = self.get_company_assets(company_id=company_id, archived=archived)
+        passwords = defaultdict(list)
+        for p in self.do_request('GET','asset_passwords',{'company_id':company_id}):
+            if p.get('passwordable_type') == 'Asset':
+                passwords[p['passwordable_id']].append(p)
+
+        return [{'data': a, 'passwords': passwords.get(a['id'], [])} for a in assets]
+
     def create_asset(self, company_id: int, asset_layout_id: int,  name: str, primary_serial:str = None, primary_mail: str = None, primary_model: str = None, primary_manufacturer: str = None, custom_fields: dict = None):
         data = {
-            'asset': {}
+            'asset': {
+                'asset_layout_id': asset_layout_id,
+                'name': name
+            }
         }
-        
-        data['asset']['asset_layout_id'] = asset_layout_id
-        data['asset']['name'] = name        
-        if primary_serial is not None: data['asset']['primary_serial'] = primary_serial
-        if primary_mail is not None: data['asset']['primary_mail'] = primary_mail
-        if primary_model is not None: data['asset']['primary_model'] = primary_model
-        if primary_manufacturer is not None: data['asset']['primary_manufacturer'] = primary_manufacturer
-        if custom_fields is not None: data['asset']['custom_fields'] = custom_fields
-        
+        data['asset'].update(_compact({
+            'primary_serial': primary_serial,
+            'primary_mail': primary_mail,
+            'primary_model': primary_model,
+            'primary_manufacturer': primary_manufacturer,
+            'custom_fields': custom_fields
+        }))
+
         return self.do_request('POST',f'companies/{company_id}/assets',data)
             
     def update_asset(self, id: int, company_id: int, asset_layout_id: int = None, name: str = None, primary_serial:str = None, primary_mail: str = None, primary_model: str = None, primary_manufacturer: str = None, custom_fields: dict = None):
-        data = {
-            'asset': {}
-        }
         # get the name and the asset layout.... why does the api require these again?
         # may need to add even more
         if name is None or asset_layout_id is None:
-            a = self.do_request('GET','assets',{'id': id, 'company_id': company_id})[0]
-            name = a['name']
-            asset_layout_id = a['asset_layout_id']
-        data['asset']['asset_layout_id'] = asset_layout_id
-        data['asset']['name'] = name        
-        if primary_serial is not None: data['asset']['primary_serial'] = primary_serial
-        if primary_mail is not None: data['asset']['primary_mail'] = primary_mail
-        if primary_model is not None: data['asset']['primary_model'] = primary_model
-        if primary_manufacturer is not None: data['asset']['primary_manufacturer'] = primary_manufacturer
+            cached_name, cached_layout_id = self._asset_meta(id, company_id)
+            if name is None: name = cached_name
+            if asset_layout_id is None: asset_layout_id = cached_layout_id
+        data = {
+            'asset': {
+                'asset_layout_id': asset_layout_id,
+                'name': name
+            }
+        }
+        data['asset'].update(_compact({
+            'primary_serial': primary_serial,
+            'primary_mail': primary_mail,
+            'primary_model': primary_model,
+            'primary_manufacturer': primary_manufacturer
+        }))
         if custom_fields is not None: 
-            parsed_data = []
-            for key, value in custom_fields.items():
-                new_key = key.lower().replace(" ", "_")
-                parsed_data.append({new_key: value})    
-    
-            data['asset']['custom_fields'] = parsed_data
-        
-        
+            data['asset']['custom_fields'] = [{key.lower().translate(_CF_TRANS): value} for key, value in custom_fields.items()]
+
+        result = self.do_request('PUT',f'companies/{company_id}/assets/{id}',data)
+        # Remember what the asset is now, or forget it if the update didn't go through
+        if isinstance(result, dict) and isinstance(result.get('asset'), dict):
+            self._remember_asset_meta(id, company_id, result['asset'].get('name', name), result['asset'].get('asset_layout_id', asset_layout_id))
+        else:
+            self._asset_meta_cache.pop((id, company_id), None)
+        return result
 
-        return self.do_request('PUT',f'companies/{company_id}/assets/{id}',data)
+    def _asset_meta(self, id: int, company_id: int):
+        # (name, asset_layout_id) of an asset, from the cache if we can
+        key = (id, company_id)
+        cached = self._asset_meta_cache.get(key)
+        if cached is not None and time.time() - cached[0] < self.asset_meta_ttl:
+            self._asset_meta_cache.move_to_end(key)
+            return cached[1:]
+        a = self.do_request('GET','assets',{'id': id, 'company_id': company_id})[0]
+        return self._remember_asset_meta(id, company_id, a['name'], a['asset_layout_id'])
+
+    def _remember_asset_meta(self, id: int, company_id: int, name: str, asset_layout_id: int):
+        if self.asset_meta_ttl > 0:
+            key = (id, company_id)
+            self._asset_meta_cache[key] = (time.time(), name, asset_layout_id)
+            self._asset_meta_cache.move_to_end(key)
+            if len(self._asset_meta_cache) > ASSET_META_CACHE_SIZE:
+                self._asset_meta_cache.popitem(last=False)
+        return name, asset_layout_id
 
     def remove_asset(self, id: int, company_id: int):
+        self._asset_meta_cache.pop((id, company_id), None)
         return self.do_request('DELETE',f'companies/{company_id}/assets/{id}')
     
     def archive_asset(self, id: int, company_id: int):
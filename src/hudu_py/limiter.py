@@ -0,0 +1,33 @@
+import threading
+import time
+
+
+class TokenBucket(object):
+    """Thread safe token bucket rate limiter.
+
+    Holds up to `capacity` tokens, refilled at `rate` tokens per second.
+    :meth:`acquire` takes a token, blocking until one is available.
+    """
+
+    def __init__(self, rate, capacity=None):
+        if rate <= 0:
+            raise ValueError('rate must be greater than 0')
+        if capacity is not None and capacity < 1:
+            raise ValueError('capacity must be at least 1')
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(rate, 1))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
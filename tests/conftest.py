@@ -0,0 +1,16 @@
+import os
+import sys
+
+# API.py imports its helper modules (logger, limiter) as top level modules
+_src = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+for path in (_src, os.path.join(_src, 'hudu_py')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from pytest import fixture
+
+
+@fixture
+def hudu():
+    from hudu_py.API import Hudu
+    return Hudu(api_key='test-key', domain='hudu.example.com', rps=1000)
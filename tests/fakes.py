@@ -0,0 +1,44 @@
+import json
+import threading
+
+
+class FakeResponse(object):
+    def __init__(self, status_code=200, body=None, headers=None):
+        self.status_code = status_code
+        self.content = json.dumps(body).encode('utf-8')
+        self.headers = headers or {}
+        self.reason = 'Fake'
+
+
+class FakeSession(object):
+    """Stands in for requests.Session. `pages` maps a page number to a response, anything else is an empty page"""
+
+    def __init__(self, pages=None):
+        self.pages = pages or {}
+        self.calls = []
+        self.writes = []
+        self._lock = threading.Lock()
+
+    def get(self, URI, params=None):
+        with self._lock:
+            self.calls.append(dict(params))
+        page = self.pages.get(params['page'], [])
+        if callable(page):
+            page = page(params)
+        if isinstance(page, FakeResponse):
+            return page
+        return FakeResponse(200, {'items': page})
+
+    def _write(self, method, URI, **kwargs):
+        with self._lock:
+            self.writes.append((method, URI, kwargs))
+        return FakeResponse(200, {'ok': True})
+
+    def post(self, URI, **kwargs):
+        return self._write('POST', URI, **kwargs)
+
+    def put(self, URI, **kwargs):
+        return self._write('PUT', URI, **kwargs)
+
+    def delete(self, URI, **kwargs):
+        return self._write('DELETE', URI, **kwargs)
@@ -0,0 +1,106 @@
+import json
+
+from pytest import fixture, importorskip, raises
+
+httpx = importorskip('httpx')
+importorskip('h2')
+
+from hudu_py import API
+from hudu_py.API import Hudu
+
+
+class FakeHttpxResponse(object):
+    # httpx responses have reason_phrase, not reason
+    def __init__(self, status_code, body, reason_phrase='OK'):
+        self.status_code = status_code
+        self.content = json.dumps(body).encode('utf-8')
+        self.headers = {}
+        self.reason_phrase = reason_phrase
+
+
+class FakeClient(object):
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.sent = []
+        self.response = FakeHttpxResponse(200, {'ok': True})
+
+    def _send(self, method, URI, **kwargs):
+        self.sent.append((method, URI, kwargs))
+        return self.response
+
+    def get(self, URI, **kwargs):
+        return self._send('GET', URI, **kwargs)
+
+    def put(self, URI, **kwargs):
+        return self._send('PUT', URI, **kwargs)
+
+    def post(self, URI, **kwargs):
+        return self._send('POST', URI, **kwargs)
+
+
+@fixture
+def http2_hudu(monkeypatch):
+    monkeypatch.setattr(API.httpx, 'Client', FakeClient)
+    return Hudu(api_key='test-key', domain='hudu.example.com', rps=1000, http2=True)
+
+
+def test_client_behaves_like_the_requests_session(http2_hudu):
+    kwargs = http2_hudu.session.kwargs
+    assert kwargs['timeout'] is None
+    assert kwargs['follow_redirects'] is True
+    assert isinstance(kwargs['transport'], API._RetryTransport)
+    assert kwargs['headers']['x-api-key'] == 'test-key'
+
+
+def test_put_sends_content_bytes(http2_hudu):
+    http2_hudu.update_article(5, 'Title', 'Body')
+
+    [(method, URI, kwargs)] = http2_hudu.session.sent
+    assert method == 'PUT'
+    assert set(kwargs) == {'content'}
+    assert isinstance(kwargs['content'], bytes)
+    assert json.loads(kwargs['content']) == {'article': {'name': 'Title', 'content': 'Body'}}
+
+
+def test_errors_use_reason_phrase(http2_hudu):
+    http2_hudu.session.response = FakeHttpxResponse(500, {}, 'Internal Server Error')
+
+    with raises(ValueError, match='Error 500 --- Internal Server Error'):
+        http2_hudu.get_articles()
+
+
+def scripted_transport(monkeypatch, statuses):
+    calls = []
+    slept = []
+
+    def handle_request(self, request):
+        calls.append(request.method)
+        return httpx.Response(statuses[len(calls) - 1], request=request)
+
+    monkeypatch.setattr(httpx.HTTPTransport, 'handle_request', handle_request)
+    monkeypatch.setattr(API.time, 'sleep', slept.append)
+    return API._RetryTransport(), calls, slept
+
+
+def test_transport_retries_gateway_errors(monkeypatch):
+    transport, calls, slept = scripted_transport(monkeypatch, [502, 504, 503, 200])
+
+    response = transport.handle_request(httpx.Request('PUT', 'https://hudu.example.com/api/v1/articles/1'))
+
+    assert response.status_code == 200
+    assert len(calls) == 4
+    assert slept == [0, 1.0, 2.0]
+
+
+def test_transport_gives_up_after_retries(monkeypatch):
+    transport, calls, slept = scripted_transport(monkeypatch, [502] * 10)
+
+    assert transport.handle_request(httpx.Request('GET', 'https://hudu.example.com/api/v1/articles')).status_code == 502
+    assert len(calls) == API.GATEWAY_RETRIES + 1
+
+
+def test_transport_does_not_retry_post(monkeypatch):
+    transport, calls, slept = scripted_transport(monkeypatch, [502, 200])
+
+    assert transport.handle_request(httpx.Request('POST', 'https://hudu.example.com/api/v1/articles')).status_code == 502
+    assert len(calls) == 1
@@ -0,0 +1,33 @@
+import datetime
+
+from pytest import mark, raises
+
+from hudu_py import API
+
+BODY = {
+    'asset': {
+        'name': 'Sérver',
+        'custom_fields': [{1: 'int key'}, {'installed': datetime.date(2024, 1, 2)}],
+        'checked': datetime.datetime(2024, 1, 2, 3, 4, 5, 123456, tzinfo=datetime.timezone.utc),
+        'nothing': None
+    }
+}
+
+
+def test_stdlib_dumps_handles_int_keys_and_dates():
+    assert API._loads(API._stdlib_dumps(BODY)) == {'asset': {
+        'name': 'Sérver',
+        'custom_fields': [{'1': 'int key'}, {'installed': '2024-01-02'}],
+        'checked': '2024-01-02T03:04:05.123456+00:00',
+        'nothing': None
+    }}
+
+
+@mark.skipif(API.orjson is None, reason='orjson not installed')
+def test_both_backends_send_the_same_body():
+    assert API._orjson_dumps(BODY) == API._stdlib_dumps(BODY)
+
+
+def test_stdlib_dumps_still_rejects_unknown_types():
+    with raises(TypeError):
+        API._stdlib_dumps({'x': object()})
@@ -0,0 +1,61 @@
+import json
+import os
+
+from pytest import fixture
+
+from hudu_py import API
+from hudu_py.API import Hudu
+from tests.fakes import FakeSession
+
+
+@fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(API, 'LOOKUP_CACHE_DIR', str(tmp_path))
+    monkeypatch.setattr(API, '_lookup_cache', {})
+    return tmp_path
+
+
+def make_hudu(session, api_key='test-key', api_version='v1'):
+    hudu = Hudu(api_key=api_key, domain='hudu.example.com', api_version=api_version, rps=1000)
+    hudu.session = session
+    return hudu
+
+
+def test_cache_is_kept_per_version_and_key(cache_dir):
+    a = make_hudu(FakeSession({1: [{'id': 1, 'name': 'Acme'}]}))
+    assert a._load_lookup_rows('companies') == [{'id': 1, 'name': 'Acme'}]
+
+    # same domain, different key: mustn't see the first client's table
+    b = make_hudu(FakeSession({1: [{'id': 2, 'name': 'Other'}]}), api_key='other-key')
+    assert b._load_lookup_rows('companies') == [{'id': 2, 'name': 'Other'}]
+
+    c = make_hudu(FakeSession({1: [{'id': 3, 'name': 'V2'}]}), api_version='v2')
+    assert c._load_lookup_rows('companies') == [{'id': 3, 'name': 'V2'}]
+
+    # and the key itself never ends up in the path
+    for root, dirs, files in os.walk(cache_dir):
+        assert 'test-key' not in root
+
+
+def test_cache_hit_skips_the_api(cache_dir):
+    make_hudu(FakeSession({1: [{'id': 1, 'name': 'Acme'}]}))._load_lookup_rows('companies')
+    API._lookup_cache.clear()
+
+    session = FakeSession()
+    assert make_hudu(session)._load_lookup_rows('companies') == [{'id': 1, 'name': 'Acme'}]
+    assert session.calls == []
+
+
+def test_wrong_shape_cache_is_refetched(cache_dir):
+    hudu = make_hudu(FakeSession({1: [{'id': 1, 'name': 'Acme'}]}))
+    hudu._load_lookup_rows('companies')
+    API._lookup_cache.clear()
+    [cache_file] = [os.path.join(root, f) for root, dirs, files in os.walk(cache_dir) for f in files]
+
+    for bad in ({'id': 1}, [1, 2], [{'id': 1}]):
+        with open(cache_file, 'w') as file:
+            json.dump(bad, file)
+        session = FakeSession({1: [{'id': 5, 'name': 'Fresh'}]})
+        assert make_hudu(session)._load_lookup_rows('companies') == [{'id': 5, 'name': 'Fresh'}]
+        assert len(session.calls) == 1
+        API._lookup_cache.clear()
@@ -0,0 +1,260 @@
+import json
+
+from pytest import raises
+
+from hudu_py.API import Hudu
+from tests.fakes import FakeResponse, FakeSession
+
+
+def capture(monkeypatch):
+    # Hudu has __slots__, so do_request is patched on the class rather than the instance
+    sent = []
+    monkeypatch.setattr(Hudu, 'do_request', lambda self, method='GET', endpoint=None, p={}: sent.append((method, endpoint, p)) or {})
+    return sent
+
+
+def test_create_asset_password_defaults_send_only_required(hudu, monkeypatch):
+    sent = capture(monkeypatch)
+
+    hudu.create_asset_password('n', 'u', 'p', 'Asset', None, None, None, None, 9)
+
+    assert sent == [('POST', 'asset_passwords', {'asset_password': {
+        'name': 'n',
+        'username': 'u',
+        'password': 'p',
+        'company_id': 9,
+        'passwordable_type': 'Asset'
+    }})]
+
+
+def test_create_asset_password_sends_given_optionals(hudu, monkeypatch):
+    sent = capture(monkeypatch)
+
+    hudu.create_asset_password('n', 'u', 'p', 'Asset', 'otp', 'https://x', 'Admin', 'slug', 9,
+                               description='d', passwordable_id=42, in_portal=False, password_folder_id=3)
+
+    assert sent[0][2]['asset_password'] == {
+        'name': 'n',
+        'username': 'u',
+        'password': 'p',
+        'company_id': 9,
+        'description': 'd',
+        'passwordable_type': 'Asset',
+        'passwordable_id': 42,
+        'in_portal': False,
+        'otp_secret': 'otp',
+        'url': 'https://x',
+        'password_type': 'Admin',
+        'password_folder_id': 3,
+        'slug': 'slug'
+    }
+
+
+def fake_assets(monkeypatch, name='Server', asset_layout_id=7):
+    # answers the lookup GET and echoes the PUT back, like Hudu does
+    sent = []
+
+    def do_request(self, method='GET', endpoint=None, p={}):
+        sent.append((method, endpoint, p))
+        if method == 'GET':
+            return [{'id': p['id'], 'name': name, 'asset_layout_id': asset_layout_id}]
+        if method == 'PUT':
+            return {'asset': dict(p['asset'])}
+        return {}
+
+    monkeypatch.setattr(Hudu, 'do_request', do_request)
+    return sent
+
+
+def test_asset_meta_cache_is_off_by_default(hudu, monkeypatch):
+    """Without asset_meta_ttl, every update reads fresh values, so renames made elsewhere aren't undone"""
+    sent = fake_assets(monkeypatch)
+
+    hudu.update_asset(1, 2, primary_serial='a')
+    hudu.update_asset(1, 2, primary_serial='b')
+
+    assert [m for m, e, p in sent] == ['GET', 'PUT', 'GET', 'PUT']
+    assert len(hudu._asset_meta_cache) == 0
+
+
+def test_asset_meta_cache_miss_then_hit(hudu, monkeypatch):
+    hudu.asset_meta_ttl = 60
+    sent = fake_assets(monkeypatch)
+
+    hudu.update_asset(1, 2, primary_serial='a')
+    hudu.update_asset(1, 2, primary_serial='b')
+
+    assert [m for m, e, p in sent] == ['GET', 'PUT', 'PUT']
+    assert sent[-1][2]['asset']['name'] == 'Server'
+    assert sent[-1][2]['asset']['asset_layout_id'] == 7
+
+
+def test_asset_meta_cache_expires(hudu, monkeypatch):
+    hudu.asset_meta_ttl = 60
+    sent = fake_assets(monkeypatch)
+    hudu.update_asset(1, 2, primary_serial='a')
+
+    key = (1, 2)
+    hudu._asset_meta_cache[key] = (hudu._asset_meta_cache[key][0] - 61,) + hudu._asset_meta_cache[key][1:]
+    hudu.update_asset(1, 2, primary_serial='b')
+
+    assert [m for m, e, p in sent] == ['GET', 'PUT', 'GET', 'PUT']
+
+
+def test_asset_meta_cache_refreshed_by_put(hudu, monkeypatch):
+    hudu.asset_meta_ttl = 60
+    sent = fake_assets(monkeypatch)
+
+    hudu.update_asset(1, 2, name='Renamed', asset_layout_id=8)
+    hudu.update_asset(1, 2, primary_serial='b')
+
+    assert [m for m, e, p in sent] == ['PUT', 'PUT']
+    assert sent[-1][2]['asset']['name'] == 'Renamed'
+    assert sent[-1][2]['asset']['asset_layout_id'] == 8
+
+
+def test_asset_meta_cache_evicted_on_remove(hudu, monkeypatch):
+    hudu.asset_meta_ttl = 60
+    sent = fake_assets(monkeypatch)
+
+    hudu.update_asset(1, 2, primary_serial='a')
+    hudu.remove_asset(1, 2)
+    hudu.update_asset(1, 2, primary_serial='b')
+
+    assert [m for m, e, p in sent] == ['GET', 'PUT', 'DELETE', 'GET', 'PUT']
+
+
+def test_swapped_session_is_used_for_writes(hudu):
+    """POST/PUT/DELETE go to whatever session is on the client now, not the one from __init__"""
+    hudu.session = FakeSession()
+
+    assert hudu.create_article('Title', 'Body') == {'ok': True}
+    hudu.remove_article(5)
+
+    assert [(m, URI) for m, URI, kw in hudu.session.writes] == [
+        ('POST', 'https://hudu.example.com/api/v1/articles'),
+        ('DELETE', 'https://hudu.example.com/api/v1/articles/5')
+    ]
+
+
+def test_headers_are_a_read_only_mapping(hudu):
+    assert hudu.headers['x-api-key'] == 'test-key'
+    assert hudu.session.headers['x-api-key'] == 'test-key'
+    with raises(TypeError):
+        hudu.headers['x-api-key'] = 'other'
+
+
+def fake_company(monkeypatch, assets, passwords):
+    sent = []
+
+    def do_request(self, method='GET', endpoint=None, p={}):
+        sent.append((method, endpoint, p))
+        if endpoint == 'asset_passwords':
+            return passwords
+        if endpoint.endswith('/assets'):
+            return assets
+        return [assets[0]]
+
+    monkeypatch.setattr(Hudu, 'do_request', do_request)
+    return sent
+
+
+COMPANY_PASSWORDS = [
+    {'id': 10, 'passwordable_id': 1, 'passwordable_type': 'Asset'},
+    {'id': 11, 'passwordable_id': 1, 'passwordable_type': 'Asset'},
+    {'id': 12, 'passwordable_id': 2, 'passwordable_type': 'Website'},
+    {'id': 13, 'passwordable_id': None, 'passwordable_type': None}
+]
+
+
+def test_company_assets_with_passwords(hudu, monkeypatch):
+    sent = fake_company(monkeypatch, [{'id': 1}, {'id': 2}, {'id': 3}], COMPANY_PASSWORDS)
+
+    result = hudu.get_company_assets_with_passwords(9)
+
+    assert [(r['data']['id'], [p['id'] for p in r['passwords']]) for r in result] == [
+        (1, [10, 11]),
+        # a website password with the same id as asset 2 isn't the asset's
+        (2, []),
+        # no passwords at all
+        (3, [])
+    ]
+    assert len(sent) == 2
+
+
+def test_company_asset_ignores_other_passwordable_types(hudu, monkeypatch):
+    fake_company(monkeypatch, [{'id': 2}], COMPANY_PASSWORDS)
+
+    assert hudu.get_company_asset(9, 2)['passwords'] == []
+    assert [p['id'] for p in hudu.get_company_asset(9, 1)['passwords']] == [10, 11]
+
+
+def test_write_body_is_sent_as_json_bytes(hudu):
+    hudu.session = FakeSession()
+
+    hudu.create_article('Title', 'Body', folder_id=3)
+
+    [(method, URI, kwargs)] = hudu.session.writes
+    assert set(kwargs) == {'data'}
+    assert isinstance(kwargs['data'], bytes)
+    assert json.loads(kwargs['data']) == {'article': {'name': 'Title', 'content': 'Body', 'folder_id': 3}}
+
+
+def test_create_asset_layouts_sends_field_dicts(hudu, monkeypatch):
+    sent = capture(monkeypatch)
+    field = Hudu.Field('Serial', True, False, Hudu.FieldType.TEXT, hint='S/N', position=1)
+
+    hudu.create_asset_layouts('Servers', 'fas fa-server', '#000', '#fff', [field])
+
+    assert sent[0][2]['asset_layout']['fields'] == [{
+        'label': 'Serial',
+        'min': None,
+        'max': None,
+        'show_in_list': True,
+        'required': False,
+        'field_type': 'Text',
+        'hint': 'S/N',
+        'options': None,
+        'posistion': 1,
+        'expiration': False,
+        'linkable_id': None
+    }]
+    assert sent[0][2]['asset_layout']['fields'] == [field.to_dict()]
+
+
+def test_single_item_getters_run(hudu):
+    """These used to hit a NameError before making any request"""
+    hudu.session = FakeSession({1: FakeResponse(200, {'article': {'id': 5}})})
+    assert hudu.get_article(5) == [{'id': 5}]
+
+    hudu.session = FakeSession({1: FakeResponse(200, {'asset_layout': {'id': 6}})})
+    assert hudu.get_asset_layout(6) == [{'id': 6}]
+
+
+def test_get_assets_by_company_only(hudu):
+    hudu.session = FakeSession({1: [{'id': 1}]})
+
+    assert hudu.get_assets(company_id=9) == [{'id': 1}]
+    assert hudu.session.calls[0]['company_id'] == 9
+    assert hudu.session.calls[0]['archived'] is False
+
+
+def test_update_asset_normalises_custom_field_keys(hudu, monkeypatch):
+    sent = capture(monkeypatch)
+
+    hudu.update_asset(1, 2, asset_layout_id=7, name='Server', custom_fields={'Serial No': 1, 'OS': 'Linux'})
+
+    assert sent[0][2]['asset']['custom_fields'] == [{'serial_no': 1}, {'os': 'Linux'}]
+
+
+def test_required_fields_are_sent_even_when_none(hudu, monkeypatch):
+    """Only optional fields get dropped when they're None, required ones go out as null like they always did"""
+    sent = capture(monkeypatch)
+
+    hudu.create_article(None, None)
+    hudu.create_asset_layouts('Servers', None, None, None, [])
+    hudu.create_asset(9, None, 'Server')
+
+    assert sent[0][2] == {'article': {'name': None, 'content': None}}
+    assert sent[1][2] == {'asset_layout': {'name': 'Servers', 'icon': None, 'color': None, 'icon_color': None, 'fields': []}}
+    assert sent[2][2] == {'asset': {'asset_layout_id': None, 'name': 'Server'}}
@@ -0,0 +1,85 @@
+from itertools import islice
+
+from pytest import fixture
+
+from hudu_py import API
+from tests.fakes import FakeResponse, FakeSession
+
+
+def rows(start, count):
+    return [{'id': i} for i in range(start, start + count)]
+
+
+@fixture(autouse=True)
+def no_sleep(monkeypatch):
+    monkeypatch.setattr(API, '_sleep_for_429', lambda response, attempt: 0)
+
+
+def test_empty_result(hudu):
+    """An empty first page is the whole result"""
+    hudu.session = FakeSession()
+
+    assert hudu.do_request('GET', 'articles') == []
+    assert [c['page'] for c in hudu.session.calls] == [1]
+
+
+def test_exact_multiple_of_page_size(hudu):
+    """Full pages keep going, and the empty page after them ends it without asking for much more"""
+    hudu.session = FakeSession({1: rows(0, 1000), 2: rows(1000, 1000)})
+
+    result = hudu.do_request('GET', 'articles')
+
+    assert [r['id'] for r in result] == list(range(2000))
+    assert sorted(c['page'] for c in hudu.session.calls) == [1, 2, 3, 4]
+
+
+def test_single_full_page_takes_two_requests(hudu):
+    hudu.session = FakeSession({1: rows(0, 1000)})
+
+    assert len(hudu.do_request('GET', 'articles')) == 1000
+    assert len(hudu.session.calls) == 2
+
+
+def test_falls_back_to_25_row_pages(hudu):
+    """Endpoints that ignore page_size give 25 rows, so we page by 25 instead"""
+    hudu.session = FakeSession({1: rows(0, 25), 2: rows(25, 25), 3: rows(50, 10)})
+
+    result = hudu.do_request('GET', 'companies')
+
+    assert [r['id'] for r in result] == list(range(60))
+    assert hudu.session.calls[0]['page_size'] == 1000
+    assert all(c['page_size'] == 25 for c in hudu.session.calls[1:])
+
+
+def test_429_on_middle_page_is_retried(hudu):
+    """A rate limited page is asked for again, and the results stay in order"""
+    hits = []
+
+    def page_3(params):
+        hits.append(params['page'])
+        if len(hits) == 1:
+            return FakeResponse(429, {})
+        return rows(2000, 1000)
+
+    hudu.session = FakeSession({1: rows(0, 1000), 2: rows(1000, 1000), 3: page_3, 4: rows(3000, 5)})
+
+    result = hudu.do_request('GET', 'articles')
+
+    assert [r['id'] for r in result] == list(range(3005))
+    assert len(hits) == 2
+
+
+def test_errors_past_the_last_page_are_ignored(hudu):
+    hudu.session = FakeSession({1: rows(0, 1000), 2: rows(1000, 1000), 3: rows(2000, 1000), 4: rows(3000, 1), 5: FakeResponse(500, {})})
+
+    assert len(hudu.do_request('GET', 'articles')) == 3001
+
+
+def test_break_from_iter_pages(hudu):
+    """Stopping early hands back the first items and doesn't fetch every page"""
+    hudu.session = FakeSession({n: rows((n - 1) * 1000, 1000) for n in range(1, 50)})
+
+    first = list(islice(hudu.iter_pages('articles'), 1500))
+
+    assert [r['id'] for r in first] == list(range(1500))
+    assert len(hudu.session.calls) < 49
@@ -0,0 +1,92 @@
+import time
+
+from pytest import fixture, raises
+
+from hudu_py import API, limiter
+from hudu_py.limiter import TokenBucket
+from tests.fakes import FakeResponse
+
+
+@fixture
+def slept(monkeypatch):
+    delays = []
+    monkeypatch.setattr(API.time, 'sleep', delays.append)
+    monkeypatch.setattr(API.random, 'random', lambda: 0.5)
+    return delays
+
+
+def test_retry_after_seconds(slept):
+    assert API._sleep_for_429(FakeResponse(429, {}, {'Retry-After': '2'}), 0) == 2
+    assert slept == [2]
+
+
+def test_reset_as_seconds_from_now(slept):
+    assert API._sleep_for_429(FakeResponse(429, {}, {'X-RateLimit-Reset': '3'}), 0) == 3
+
+
+def test_reset_as_epoch(slept):
+    delay = API._sleep_for_429(FakeResponse(429, {}, {'X-RateLimit-Reset': str(time.time() + 5)}), 0)
+    assert 4 < delay <= 5
+
+
+def test_reset_in_the_past_backs_off(slept):
+    """A reset that has already gone by mustn't turn into a zero second wait"""
+    assert API._sleep_for_429(FakeResponse(429, {}, {'X-RateLimit-Reset': str(time.time() - 5)}), 2) == 4.5
+
+
+def test_no_headers_backs_off_exponentially(slept):
+    assert [API._sleep_for_429(FakeResponse(429, {}), n) for n in (0, 1, 3, 10)] == [1.5, 2.5, 8.5, 60]
+
+
+def test_session_leaves_429_to_us(hudu):
+    retries = hudu.session.get_adapter('https://hudu.example.com').max_retries
+    assert 429 not in retries.status_forcelist
+
+
+def test_gives_up_after_max_attempts(hudu, slept):
+    calls = []
+
+    def get(URI, params=None):
+        calls.append(params['page'])
+        return FakeResponse(429, {})
+
+    hudu.session.get = get
+    with raises(ValueError, match='429'):
+        hudu.do_request('GET', 'articles')
+    assert len(calls) == API.MAX_ATTEMPTS
+
+
+def test_default_rate_is_under_hudu_limit():
+    from hudu_py.API import Hudu
+    default = Hudu(api_key='test-key', domain='hudu.example.com')
+    # 300 requests a minute, including the initial burst
+    assert default.rps * 60 + default._limiter.capacity <= 300
+
+
+def test_rejects_non_positive_rps():
+    from hudu_py.API import Hudu
+    for rps in (0, -1):
+        with raises(ValueError):
+            Hudu(api_key='test-key', domain='hudu.example.com', rps=rps)
+    with raises(ValueError):
+        TokenBucket(rate=0)
+
+
+def test_token_bucket_paces_after_burst(monkeypatch):
+    now = [100.0]
+    slept = []
+
+    def sleep(seconds):
+        slept.append(seconds)
+        now[0] += seconds
+
+    monkeypatch.setattr(limiter.time, 'monotonic', lambda: now[0])
+    monkeypatch.setattr(limiter.time, 'sleep', sleep)
+    bucket = TokenBucket(rate=2, capacity=2)
+    for _ in range(4):
+        bucket.acquire()
+    assert slept == [0.5, 0.5]
+
+
+def test_fractional_rate_still_gets_a_token():
+    TokenBucket(rate=0.5).acquire()